@@ -1,17 +1,24 @@
 # src/fetch_api_data.py
 
 import os
+import sys
 import json
 from pathlib import Path
 from dotenv import load_dotenv
 from src.webapp_class import APIClient
+from src.cache_class import ResponseCache
 
 # --- Load environment variables ---
 load_dotenv()
 
 # --- Configuration ---
 BASE_URL = os.getenv("BASE_URL")
-OUTPUT_FOLDER = Path("outputs/json_exports")
+OUTPUT_FOLDER = Path(os.getenv("OUTPUT_DIR", "outputs")) / "json_exports"  # Per-book folder when run from main.py
+
+# HTTP cache lives outside outputs/ so it survives 05_cleanup
+CACHE_DIR = Path(os.getenv("HTTP_CACHE_DIR", "cache/http"))
+CACHE_TTL_SECONDS = int(os.getenv("HTTP_CACHE_TTL", "900"))  # Only used when the server sends no ETag/Last-Modified
+USE_CACHE = "--no-cache" not in sys.argv and os.getenv("NO_CACHE", "0") != "1"
 
 BOOK_ID = os.environ.get("BOOK_ID")
 if not BOOK_ID:
@@ -37,7 +44,8 @@ def save_json(data, name):
     print(f"Saved: {path}")
 
 def fetch_data():
-    client = APIClient(BASE_URL, LOGIN_PAGE, LOGIN_URL)
+    cache = ResponseCache(CACHE_DIR, ttl_seconds=CACHE_TTL_SECONDS, enabled=USE_CACHE)
+    client = APIClient(BASE_URL, LOGIN_PAGE, LOGIN_URL, cache=cache)
 
     if not client.authenticate():
         raise RuntimeError("Authentication failed")
@@ -51,8 +59,11 @@ def fetch_data():
 
     for name, endpoint in endpoints.items():
         data = client.fetch_api_data(endpoint)
-        if data:
-            save_json(data, name)
+        if not data:
+            raise RuntimeError(f"No data returned for {name} ({endpoint})")
+        save_json(data, name)
+
+    print(cache.summary() if USE_CACHE else "Cache: disabled (--no-cache)")
 
 def enrich_chronology():
     chrono_path = OUTPUT_FOLDER / "chronology_raw.json"
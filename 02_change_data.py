@@ -1,21 +1,23 @@
+import os
 import json
 import re
 from bs4 import BeautifulSoup
 from pathlib import Path
+from src.entry_store_class import EntryStore
+from src.exclusion_class import ExclusionRules
 
 # --- Config ---
-INPUT_FILE = Path("outputs/json_exports/chronology.json")
-OUTPUT_FILE = Path("outputs/json_exports/chronology_writeback.json")
-
-# Exclusion filters — match any of these to skip an entry
-EXCLUDE_TYPES = {"Allied Health Recovery Request","Clinical Records","Certificate of Capacity","Hospital Discharge Referral"}
-EXCLUDE_HANDWRITTEN = {"True"}
-
-def is_excluded(entry):
-    return (
-        entry.get("documentType") in EXCLUDE_TYPES or
-        entry.get("handwritten") in EXCLUDE_HANDWRITTEN 
-    )
+JSON_DIR = Path(os.getenv("OUTPUT_DIR", "outputs")) / "json_exports"  # Per-book folder when run from main.py
+INPUT_FILE = JSON_DIR / "chronology.json"
+OUTPUT_FILE = JSON_DIR / "chronology_writeback.json"
+STATS_FILE = JSON_DIR / "exclusion_stats.json"
+BOOK_ID = os.environ.get("BOOK_ID", "unknown")
+# Also save compact entry stores for 03/04 to open instead of re-parsing the JSON
+USE_ENTRY_STORE = os.getenv("USE_ENTRY_STORE", "0") == "1"
+
+# Exclusion rules — match any of these to skip an entry (see src/exclusion_class.py for defaults)
+RULES_FILE = Path("inputs_ctp_formatter/exclusion_rules.json")
+RULES = ExclusionRules.from_file(RULES_FILE)
 
 def split_colon_line_safe(line):
     """Split on first colon not part of time (e.g., 16:30) or ratio (1:2)."""
@@ -100,10 +102,12 @@ def clean_html_text(html):
     return "\n".join(output)
 
 
-def process_entries(data):
-    """Format entryOriginal to entryFinal unless excluded."""
-    for entry in data:
-        if is_excluded(entry):
+def process_entries(data, excluded=None):
+    """Format entryOriginal to entryFinal unless excluded (one flag per entry)."""
+    if excluded is None:
+        excluded = RULES.evaluate(RULES.frame(data)).notna().tolist()
+    for entry, skip in zip(data, excluded):
+        if skip:
             continue  # Leave entryFinal as-is
         if "entryOriginal" in entry and entry["entryOriginal"].strip():
             entry["entryFinal"] = clean_html_text(entry["entryOriginal"])
@@ -113,11 +117,26 @@ def main():
     with open(INPUT_FILE, "r", encoding="utf-8") as f:
         data = json.load(f)
 
-    updated_data = process_entries(data)
+    # Snapshot the originals before process_entries rewrites entryFinal in place
+    if USE_ENTRY_STORE:
+        EntryStore.write(data, EntryStore.default_dir(INPUT_FILE, BOOK_ID), source=INPUT_FILE)
+
+    frame = RULES.frame(data)
+    reasons = RULES.evaluate(frame)
+    stats = RULES.summarise(frame, reasons)
+    with open(STATS_FILE, "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2, ensure_ascii=False)
+    print(f"Excluded {stats['excluded']} of {stats['total']} entries: {stats['by_rule']}")
+
+    updated_data = process_entries(data, reasons.notna().tolist())
 
     with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
         json.dump(updated_data, f, indent=2, ensure_ascii=False)
 
+    if USE_ENTRY_STORE:
+        EntryStore.write(updated_data, EntryStore.default_dir(OUTPUT_FILE, BOOK_ID), source=OUTPUT_FILE)
+        print("Entry stores saved.")
+
     print(f"Cleaned file written to: {OUTPUT_FILE}")
 
 
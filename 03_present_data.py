@@ -1,24 +1,51 @@
+import os
 import json
 from pathlib import Path
 from jinja2 import Template
+from src.entry_store_class import EntryStore
+from src.diff_class import EntryDiffer
 
 # --- Config ---
+OUTPUT_DIR = os.getenv("OUTPUT_DIR", "outputs")  # Per-book folder when run from main.py
 JSON_FILES = [
-    "outputs/json_exports/chronology.json",
-    #"outputs/json_exports/chronology_updated.json",
-    "outputs/json_exports/chronology_writeback.json"
+    f"{OUTPUT_DIR}/json_exports/chronology.json",
+    #f"{OUTPUT_DIR}/json_exports/chronology_updated.json",
+    f"{OUTPUT_DIR}/json_exports/chronology_writeback.json"
 ]
-OUTPUT_HTML = "outputs/entry_comparison.html"
+OUTPUT_HTML = f"{OUTPUT_DIR}/entry_comparison.html"
+USE_ENTRY_STORE = os.getenv("USE_ENTRY_STORE", "0") == "1"
+BOOK_ID = os.environ.get("BOOK_ID", "unknown")
+DIFF_CACHE = Path(f"cache/diffs/{BOOK_ID}.json.gz")  # Outside outputs/ so it survives cleanup
+SUMMARY_ROWS = 50  # Most-changed entries listed at the top of the report
 
 # --- Load Data ---
 data_sets = []
 for file_path in JSON_FILES:
+    if USE_ENTRY_STORE:
+        # id -> entryFinal view over the memory-mapped store; HTML decoded per lookup
+        data_sets.append(EntryStore.load_or_build(file_path, BOOK_ID).field_view("entryFinal"))
+        continue
     with open(file_path, "r", encoding="utf-8") as f:
         data_sets.append({entry["id"]: entry["entryFinal"] for entry in json.load(f)})
 
 # --- Get All Unique Entry IDs ---
 all_ids = sorted(set().union(*[set(d.keys()) for d in data_sets]))
 
+# --- Diff Original vs Writeback ---
+differ = EntryDiffer(DIFF_CACHE)
+diffs = {
+    entry_id: differ.diff(data_sets[0].get(entry_id, ""), data_sets[-1].get(entry_id, ""))
+    for entry_id in all_ids
+}
+differ.save()
+print(f"Diffs: {differ.stats['computed']} computed, {differ.stats['cached']} from cache")
+
+most_changed = sorted(
+    (entry_id for entry_id in all_ids if diffs[entry_id]["counts"]["total"]),
+    key=lambda entry_id: diffs[entry_id]["counts"]["total"],
+    reverse=True,
+)[:SUMMARY_ROWS]
+
 # --- HTML Template ---
 html_template = Template("""
 <!DOCTYPE html>
@@ -32,21 +59,45 @@ html_template = Template("""
         th, td { border: 1px solid #ccc; padding: 10px; vertical-align: top; word-wrap: break-word; }
         th { background-color: #f5f5f5; }
         h2 { margin-top: 40px; }
+        ins { background-color: #d4f7d4; text-decoration: none; }
+        del { background-color: #f9d0d0; }
+        ins.mark, del.mark { font-weight: bold; padding: 0 2px; }
+        table.summary { width: auto; }
+        table.summary td, table.summary th { padding: 4px 10px; text-align: right; }
     </style>
 </head>
 <body>
     <h1>Comparison of EntryFinal Values</h1>
+    {% if most_changed %}
+        <h2>Most Changed Entries</h2>
+        <table class="summary">
+            <tr>
+                <th>Entry ID</th><th>Breaks added</th><th>Paragraphs added</th>
+                <th>Words added</th><th>Words removed</th><th>Total changes</th>
+            </tr>
+            {% for entry_id in most_changed %}
+                {% set c = diffs[entry_id].counts %}
+                <tr>
+                    <td><a href="#entry-{{ entry_id }}">{{ entry_id }}</a></td>
+                    <td>{{ c.breaks_added }}</td><td>{{ c.paragraphs_added }}</td>
+                    <td>{{ c.words_added }}</td><td>{{ c.words_removed }}</td><td>{{ c.total }}</td>
+                </tr>
+            {% endfor %}
+        </table>
+    {% endif %}
     {% for entry_id in all_ids %}
-        <h2>Entry ID: {{ entry_id }}</h2>
+        <h2 id="entry-{{ entry_id }}">Entry ID: {{ entry_id }}</h2>
         <table>
             <tr>
                 <th>Original</th>
                 <th>Writeback</th>
+                <th>Changes ({{ diffs[entry_id].counts.total }})</th>
             </tr>
             <tr>
                 {% for dataset in data_sets %}
                     <td>{{ dataset.get(entry_id, "") | safe }}</td>
                 {% endfor %}
+                <td>{{ diffs[entry_id].html | safe }}</td>
             </tr>
         </table>
     {% endfor %}
@@ -57,7 +108,9 @@ html_template = Template("""
 # --- Render and Save HTML ---
 html_output = html_template.render(
     all_ids=all_ids,
-    data_sets=data_sets
+    data_sets=data_sets,
+    diffs=diffs,
+    most_changed=most_changed
 )
 
 Path(OUTPUT_HTML).parent.mkdir(parents=True, exist_ok=True)
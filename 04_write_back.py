@@ -1,6 +1,8 @@
 import os
+import sys
 import json
 from src.webapp_class import APIClient
+from src.entry_store_class import EntryStore
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -8,12 +10,54 @@ load_dotenv()
 BASE_URL = os.getenv("BASE_URL")  
 LOGIN_PAGE_URL = f"{BASE_URL}/authed/user.action?cmd=welcome"
 LOGIN_URL = f"{BASE_URL}/authed/j_security_check"
-JSON_FILE = "outputs/json_exports/chronology_writeback.json"
+OUTPUT_DIR = os.getenv("OUTPUT_DIR", "outputs")  # Per-book folder when run from main.py
+JSON_FILE = f"{OUTPUT_DIR}/json_exports/chronology_writeback.json"
+BOOK_ID = os.getenv("BOOK_ID", "unknown")
 EXCLUDED_IDS = []  # Add IDs to exclude if needed
+USE_ENTRY_STORE = os.getenv("USE_ENTRY_STORE", "0") == "1"
+# Stream the PUT body as chunked JSON instead of building it in memory
+STREAM_UPLOAD = os.getenv("WRITEBACK_STREAM", "0") == "1"
+GZIP_UPLOAD = os.getenv("WRITEBACK_GZIP", "0") == "1"  # Only applies when streaming
+
+class CleanedPayload:
+    """Re-iterable, lazily filtered view of the writeback entries.
+
+    Used for streamed uploads and whenever entries come from the entry store.
+    Iterating it again (e.g. when the PUT is retried) re-reads the source
+    instead of keeping a filtered copy of the whole book.
+    """
+
+    def __init__(self, entries=None, store=None, exclude_ids=None):
+        self.entries = entries
+        self.store = store
+        self.exclude_ids = {str(i) for i in exclude_ids} if exclude_ids else set()
+
+    def __iter__(self):
+        if self.store is not None:
+            yield from self.store.iter_dicts(self.exclude_ids)
+            return
+        for entry in self.entries:
+            if str(entry.get("id")) not in self.exclude_ids:
+                yield entry
+
+    def __len__(self):
+        ids = self.store.ids() if self.store is not None else (e.get("id") for e in self.entries)
+        return sum(1 for i in ids if str(i) not in self.exclude_ids)
 
 # --- Load and optionally filter data ---
 def load_cleaned_payload(path, exclude_ids=None):
     try:
+        if STREAM_UPLOAD or USE_ENTRY_STORE:
+            if USE_ENTRY_STORE:
+                payload = CleanedPayload(store=EntryStore.load_or_build(path, BOOK_ID), exclude_ids=exclude_ids)
+                total = len(payload.store)
+            else:
+                with open(path, "r", encoding="utf-8") as f:
+                    payload = CleanedPayload(entries=json.load(f), exclude_ids=exclude_ids)
+                total = len(payload.entries)
+            if exclude_ids:
+                print(f"Excluded {total - len(payload)} entries based on ID filter")
+            return payload
         with open(path, "r", encoding="utf-8") as f:
             data = json.load(f)
         if exclude_ids:
@@ -28,11 +72,16 @@ def load_cleaned_payload(path, exclude_ids=None):
 # --- Upload payload ---
 def upload_chronology(client, court_book_id, payload):
     url = f"/api/v0/books/{court_book_id}/chronology/"
-    response = client.send_put_request(url, payload)
-    if response and response.status_code == 200:
-        print(f"Successfully updated Court Book ID {court_book_id} to {BASE_URL}.")
+    if STREAM_UPLOAD:
+        response = client.send_put_request(url, payload, stream=True, compress=GZIP_UPLOAD,
+                                           size_hint=os.path.getsize(JSON_FILE))
     else:
-        print(f"Failed to update Court Book ID {court_book_id}. Status: {response.status_code if response else 'N/A'}")
+        response = client.send_put_request(url, payload)
+    if response and response.status_code in (200, 201):
+        print(f"Successfully updated Court Book ID {court_book_id} to {BASE_URL}.")
+        return True
+    print(f"Failed to update Court Book ID {court_book_id}. Status: {response.status_code if response else 'N/A'}")
+    return False
 
 # --- Main execution ---
 def main():
@@ -44,7 +93,7 @@ def main():
     client = APIClient(BASE_URL, LOGIN_PAGE_URL, LOGIN_URL)
     if not client.authenticate():
         print("Authentication failed.")
-        return
+        sys.exit(1)  # Let main.py mark the book as Error
 
     payload = load_cleaned_payload(JSON_FILE, exclude_ids=EXCLUDED_IDS)
     if not payload:
@@ -53,7 +102,8 @@ def main():
 
     # 🔁 Automatically upload without confirmation
     print(f"Uploading cleaned chronology to Court Book ID {court_book_id}...")
-    upload_chronology(client, court_book_id, payload)
+    if not upload_chronology(client, court_book_id, payload):
+        sys.exit(1)  # Let main.py mark the book as Error
 
 if __name__ == "__main__":
     main()
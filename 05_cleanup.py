@@ -5,7 +5,10 @@ import shutil
 from datetime import datetime
 
 # --- Configuration ---
-SOURCE_DIR = Path("G:/01_Python/Projects/15_extraction_line_breaks/outputs")
+# main.py passes the book's own outputs/<BookID> folder, so only this book's files are archived
+SOURCE_DIR = Path(os.environ.get("OUTPUT_DIR", "G:/01_Python/Projects/15_extraction_line_breaks/outputs"))
+PER_BOOK_DIR = "OUTPUT_DIR" in os.environ
+STORE_ROOT = Path("cache/stores")  # Entry stores written by 02_change_data (USE_ENTRY_STORE=1)
 TARGET_DIR = Path("G:/01_Python/Projects/15_extraction_line_breaks/processed")
 
 # --- Get BOOK_ID from environment ---
@@ -34,6 +37,13 @@ def zip_and_cleanup():
             shutil.rmtree(item)
         else:
             item.unlink()
+    if PER_BOOK_DIR:
+        SOURCE_DIR.rmdir()
+
+    # The stores only duplicate the archived JSON, so they are not kept
+    store_dir = STORE_ROOT / book_id
+    if store_dir.exists():
+        shutil.rmtree(store_dir)
 
     print("Done.")
 
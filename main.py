@@ -1,5 +1,6 @@
 import os
 import sys
+import json
 import subprocess
 from datetime import datetime
 from pathlib import Path
@@ -11,17 +12,23 @@ from openpyxl import load_workbook
 from openpyxl.styles import Font, PatternFill
 from openpyxl.utils import get_column_letter
 
+from src.resilience_class import CircuitBreaker
+from src.checkpoint_class import CheckpointManifest
+from src.scheduler_class import JobScheduler
+from src.lease_class import LeaseStore, LeaseHeartbeat, worker_id
+
 # --- Config ---
 PROCESS_NAME: str = "CTP Clinical Entries Formatter"
 EXCEL_FILE = Path("inputs_ctp_formatter/book_id_queue.xlsx")
-STATE_FILE = Path("last_run_timestamp.txt")
 LOG_DIR = Path("inputs_ctp_formatter")
 LOG_FILE = LOG_DIR / "run_log.txt"
 BASE_URL = os.getenv("BASE_URL")
+NO_CACHE = "--no-cache" in sys.argv  # Bypass the HTTP response cache in 01_get_data
 
 ID_COL = "BookID"
 STATUS_COL = "Status"
 TIMESTAMP_COL = "Processed"
+PRIORITY_COL = "Priority"  # Optional; higher numbers run first
 SCRIPTS = [
     "01_get_data.py",
     "02_change_data.py",
@@ -30,6 +37,109 @@ SCRIPTS = [
     "05_cleanup.py",
 ]
 
+# --- Checkpointing ---
+# Each book runs in its own outputs/<BookID> folder, passed to the stage scripts
+# as OUTPUT_DIR, so workers sharing the project folder never touch each other's files
+OUTPUT_DIR = Path("outputs")
+CHECKPOINT_DIR = Path("checkpoints")
+JSON_DIR = "{out}/json_exports"
+# Artifacts each stage reads and writes ({out} is the book's output folder); a
+# stage is skipped on rerun if its checkpoint still matches them. Stages not
+# listed here, or marked always_run, always run.
+STAGE_ARTIFACTS = {
+    "01_get_data.py": {
+        # Always re-fetch so a retry never writes back a stale chronology over
+        # server-side edits; the response cache makes this a conditional request
+        "always_run": True,
+        "inputs": [],
+        "outputs": [f"{JSON_DIR}/chronology_raw.json", f"{JSON_DIR}/bookitems.json", f"{JSON_DIR}/chronology.json"],
+    },
+    "02_change_data.py": {
+        "inputs": [f"{JSON_DIR}/chronology.json", "inputs_ctp_formatter/exclusion_rules.json"],
+        "outputs": [f"{JSON_DIR}/chronology_writeback.json", f"{JSON_DIR}/exclusion_stats.json"],
+    },
+    "03_present_data.py": {
+        "inputs": [f"{JSON_DIR}/chronology.json", f"{JSON_DIR}/chronology_writeback.json"],
+        "outputs": ["{out}/entry_comparison.html"],
+    },
+    "04_write_back.py": {
+        "inputs": [f"{JSON_DIR}/chronology_writeback.json"],
+        "outputs": [],
+    },
+}
+
+
+def parse_force_stages(argv):
+    """Stages named after --force, matched by prefix (e.g. `--force 02 03` or `--force all`)."""
+    if "--force" not in argv:
+        return set()
+    names = []
+    for arg in argv[argv.index("--force") + 1:]:
+        if arg.startswith("--"):
+            break
+        names.append(arg)
+    if "all" in names:
+        return set(SCRIPTS)
+    return {script for script in SCRIPTS if any(script.startswith(name) for name in names)}
+
+
+FORCE_STAGES = parse_force_stages(sys.argv)
+
+
+def book_output_dir(book_id):
+    return OUTPUT_DIR / str(book_id)
+
+
+def stage_paths(paths, output_dir):
+    """Artifact paths with {out} resolved to the book's output folder."""
+    return [path.format(out=output_dir.as_posix()) for path in paths]
+
+# --- Multi-worker coordination ---
+# Leases, unmerged results and the last-seen queue mtime live in a shared SQLite
+# store, so several hosts can work the same queue without duplicating books.
+LEASE_DB = Path(os.getenv("LEASE_DB", str(LOG_DIR / "leases.sqlite3")))
+LEASE_TTL_SECONDS = float(os.getenv("LEASE_TTL_SECONDS", "300"))  # Renewed every TTL/3 while a book runs
+QUEUE_LOCK = "lock:queue_file"
+QUEUE_STATE_LOCK = "lock:queue_state"
+WORKER_ID = worker_id()
+
+# --- Scheduling ---
+QUEUE_STATE_FILE = LOG_DIR / "queue_state.json"
+AGING_HOURS = float(os.getenv("SCHEDULER_AGING_HOURS", "2"))  # Waiting this long halves a book's cost; 0 disables aging
+PREFETCH_SIZES = os.getenv("SCHEDULER_PREFETCH", "0") == "1"  # Fetch unknown books to size them
+_prefetch_client = None
+
+
+def prefetch_entry_count(book_id):
+    """Entry count for a book not seen before, via a cached fetch of its chronology.
+
+    Uses the same response cache as 01_get_data, which then only has to
+    revalidate the response rather than download it again.
+    """
+    global _prefetch_client
+    if _prefetch_client is None:
+        from src.webapp_class import APIClient
+        from src.cache_class import ResponseCache
+        cache = ResponseCache(os.getenv("HTTP_CACHE_DIR", "cache/http"), enabled=not NO_CACHE)
+        client = APIClient(BASE_URL, f"{BASE_URL}/authed/user.action?cmd=welcome",
+                           f"{BASE_URL}/authed/j_security_check", cache=cache)
+        if not client.authenticate():
+            raise RuntimeError("Authentication failed")
+        _prefetch_client = client  # Only reuse a session that actually logged in
+    data = _prefetch_client.fetch_api_data(f"/api/v0/books/{book_id}/chronology/")
+    if data is None:
+        raise RuntimeError("Chronology fetch failed")
+    return len(data)
+
+
+def record_book_size(scheduler, book_id, output_dir):
+    """Remember how many entries a book has so future runs can schedule it by size."""
+    try:
+        with open(output_dir / "json_exports" / "chronology_raw.json", "r", encoding="utf-8") as f:
+            scheduler.record_size(book_id, len(json.load(f)))
+    except (OSError, ValueError) as e:
+        print(f"[{book_id}] Could not record book size: {e}")
+
 
 class TeeLogger:
     def __init__(self, logfile_path):
@@ -100,20 +210,94 @@ def format_excel_queue(file_path):
     print(f"Excel formatting applied to: {file_path}")
 
 
-def run_pipeline(book_id):
+def run_pipeline(book_id, scheduler=None):
+    output_dir = book_output_dir(book_id)
     env = os.environ.copy()
     env["BOOK_ID"] = str(book_id)
-
+    env["OUTPUT_DIR"] = str(output_dir)
+    if NO_CACHE:
+        env["NO_CACHE"] = "1"
+
+    # A failed run leaves its files in the book's own folder for the retry to reuse
+    manifest = CheckpointManifest(CHECKPOINT_DIR, book_id)
+    if output_dir.exists():
+        print(f"[{book_id}] Resuming with outputs from previous failed run.")
+
+    # Each stage is checked when reached, so a re-fetch that leaves
+    # chronology.json unchanged still lets 02/03 be skipped by their hashes.
+    # A forced stage reruns itself and everything after it.
+    forced = False
     for script in SCRIPTS:
+        artifacts = STAGE_ARTIFACTS.get(script)
+        if artifacts:
+            inputs = stage_paths(artifacts["inputs"], output_dir)
+            outputs = stage_paths(artifacts["outputs"], output_dir)
+        forced = forced or script in FORCE_STAGES
+        if (not forced and artifacts and not artifacts.get("always_run")
+                and manifest.is_current(script, inputs, outputs)):
+            print(f"[{book_id}] Skipping {script} (checkpoint up to date).")
+            continue
+        if artifacts and artifacts.get("always_run"):
+            # A failed re-fetch must not fall back to the previous run's files
+            for path in outputs:
+                Path(path).unlink(missing_ok=True)
+
         print(f"[{book_id}] Running: {script}")
         result = subprocess.run(["python", script], env=env, capture_output=True, text=True)
         if result.returncode != 0:
             print(f"[{book_id}] {script} failed.\n{result.stderr}")
             return "Error"
+        if artifacts:
+            manifest.record(script, inputs, outputs)
+        if script == "01_get_data.py" and scheduler:
+            record_book_size(scheduler, book_id, output_dir)
         print(f"[{book_id}] {script} completed.")
+
+    manifest.clear()
     return "Done"
 
 
+def normalise_book_id(raw_id):
+    return str(int(raw_id)).strip() if pd.notna(raw_id) else ""
+
+
+def merge_results(store):
+    """Write every worker's finished results into the Excel queue.
+
+    The workbook is re-read under a shared lock and only the finished rows are
+    updated, so concurrent workers never overwrite each other's changes. If the
+    file can't be written, results stay in the store for the next merge.
+    """
+    results = store.unmerged_results()
+    if not results:
+        return True
+    if not store.acquire(QUEUE_LOCK, WORKER_ID, LEASE_TTL_SECONDS):
+        print("Could not lock the Excel queue; results will be merged on a later run.")
+        return False
+    try:
+        df = pd.read_excel(EXCEL_FILE)
+        df[STATUS_COL] = df[STATUS_COL].astype(str)
+        df[TIMESTAMP_COL] = df[TIMESTAMP_COL].astype(str)
+        book_ids = df[ID_COL].map(normalise_book_id)
+        not_done = df[STATUS_COL].str.strip().str.lower() != "done"
+        for book_id, status, processed in results:
+            # Earlier Done rows of a resubmitted book keep their own status
+            rows = df.index[(book_ids == book_id) & not_done]
+            df.loc[rows, STATUS_COL] = status
+            df.loc[rows, TIMESTAMP_COL] = processed
+            print(f"[{book_id}] Status updated to '{status}'")
+        df.to_excel(EXCEL_FILE, index=False)
+        format_excel_queue(EXCEL_FILE)
+        store.mark_merged([book_id for book_id, _, _ in results])
+        print(f"Excel file updated successfully ({len(results)} results merged).")
+        return True
+    except PermissionError:
+        print(f"Cannot write to {EXCEL_FILE}. Is it open?")
+        return False
+    finally:
+        store.release(QUEUE_LOCK, WORKER_ID)
+
+
 def main():
     LOG_DIR.mkdir(exist_ok=True)
     sys.stdout = TeeLogger(LOG_FILE)
@@ -121,33 +305,39 @@ def main():
     now_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     print("\n" + "=" * 70)
     print(f"PROCESS: {PROCESS_NAME}")
-    print(f"RUN STARTED: {now_str} in {BASE_URL}")
+    print(f"RUN STARTED: {now_str} in {BASE_URL} (worker {WORKER_ID})")
     print("=" * 70)
 
-    # --- Check Excel file mtime ---
-    try:
-        current_mtime = EXCEL_FILE.stat().st_mtime
-    except FileNotFoundError:
+    if not EXCEL_FILE.exists():
         print(f"Excel file not found: {EXCEL_FILE}")
         return
 
-    if STATE_FILE.exists():
-        with open(STATE_FILE, "r") as f:
-            last_mtime = float(f.read().strip())
-        if current_mtime == last_mtime:
-            print("Excel file unchanged since last run. Exiting.")
-            return
+    # Merge anything left over from runs that couldn't write the workbook
+    store = LeaseStore(LEASE_DB)
+    if not merge_results(store):
+        return
 
+    # --- Check Excel file mtime ---
+    current_mtime = EXCEL_FILE.stat().st_mtime
+    last_mtime = store.get_meta("last_mtime")
+    if last_mtime is not None and current_mtime == float(last_mtime):
+        print("Excel file unchanged since last run. Exiting.")
+        return
+
+    read_seq = store.result_seq()
     df = pd.read_excel(EXCEL_FILE)
     df[STATUS_COL] = df[STATUS_COL].astype(str)
     df[TIMESTAMP_COL] = df[TIMESTAMP_COL].astype(str)
     print(f"Loaded {len(df)} rows from Excel.")
 
-    changes_made = False
+    breaker = CircuitBreaker.from_env()
+    scheduler = JobScheduler(QUEUE_STATE_FILE, aging_hours=AGING_HOURS,
+                             estimate_fn=prefetch_entry_count if PREFETCH_SIZES else None,
+                             lock=lambda: store.hold(QUEUE_STATE_LOCK, WORKER_ID, LEASE_TTL_SECONDS))
 
+    jobs = []
     for i, row in df.iterrows():
-        raw_id = row.get(ID_COL)
-        book_id = str(int(raw_id)).strip() if pd.notna(raw_id) else ""
+        book_id = normalise_book_id(row.get(ID_COL))
         status = str(row.get(STATUS_COL)).strip().lower()
 
         print(f"Row {i}: BookID='{book_id}' Status='{status}'")
@@ -155,28 +345,56 @@ def main():
             print("Skipping")
             continue
 
-        print("Processing")
-        result = run_pipeline(book_id)
-        df.at[i, STATUS_COL] = result
-        df.at[i, TIMESTAMP_COL] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        print(f"[{book_id}] Status updated to '{result}'")
-        changes_made = True
+        raw_priority = pd.to_numeric(row.get(PRIORITY_COL), errors="coerce")
+        priority = float(raw_priority) if pd.notna(raw_priority) else 0.0
+        jobs.append((book_id, priority, i))
+
+    jobs = scheduler.order(jobs)
+    if jobs:
+        print("Processing order: " + ", ".join(book_id for book_id, _, _ in jobs))
+
+    stopped_early = False
+    for book_id, _, i in jobs:
+        if breaker.is_open():
+            print("Circuit breaker open: server unavailable, leaving remaining rows for the next run.")
+            stopped_early = True
+            break
+
+        if not store.claim(book_id, WORKER_ID, LEASE_TTL_SECONDS, since=read_seq):
+            print(f"[{book_id}] Claimed or already finished by another worker, skipping.")
+            continue
 
-    if changes_made:
         try:
-            df.to_excel(EXCEL_FILE, index=False)
-            print("Excel file updated successfully.")
-            format_excel_queue(EXCEL_FILE)
-        except PermissionError:
-            print(f"Cannot write to {EXCEL_FILE}. Is it open?")
-            return
-    else:
-        print("No updates made to Excel.")
+            print(f"[{book_id}] Processing (~{scheduler.estimated_cost(book_id)} entries)")
+            with LeaseHeartbeat(store, book_id, WORKER_ID, LEASE_TTL_SECONDS) as heartbeat:
+                result = run_pipeline(book_id, scheduler)
+            if heartbeat.lost or not store.renew(book_id, WORKER_ID, LEASE_TTL_SECONDS):
+                # Another worker took the book over; its result is the one that counts
+                print(f"[{book_id}] Lease lost during processing; result '{result}' not recorded.")
+                continue
+            if result == "Error" and breaker.is_open():
+                # The server went down mid-book; don't make the user resubmit it
+                print(f"[{book_id}] Failed while server unavailable; status left unchanged for retry.")
+                stopped_early = True
+                break
+            store.record_result(book_id, result, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), WORKER_ID)
+            if result == "Done":
+                scheduler.mark_done(book_id)
+        finally:
+            store.release(book_id, WORKER_ID)
+
+        # Merge after each book so users (and other workers) see progress straight away
+        merge_results(store)
+
+    if not merge_results(store):
+        return
 
-    # Always update timestamp so file won't be reprocessed
-    with open(STATE_FILE, "w") as f:
-        f.write(str(current_mtime))
-    print("Timestamp updated to reflect last checked state.")
+    # Update timestamp so file won't be reprocessed, unless rows were left for the next run
+    if stopped_early:
+        print("Batch stopped early; timestamp not updated so the next run retries the remaining rows.")
+    else:
+        store.set_meta("last_mtime", current_mtime)
+        print("Timestamp updated to reflect last checked state.")
 
     print("All pending Book IDs processed.")
     print(f"Run completed at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -0,0 +1,98 @@
+import gzip
+import hashlib
+import json
+import time
+from pathlib import Path
+
+
+class ResponseCache:
+    """On-disk cache of API responses, stored gzip-compressed with their validators."""
+
+    def __init__(self, cache_dir, ttl_seconds=3600, enabled=True):
+        self.cache_dir = Path(cache_dir)
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0, "stored": 0}
+        if self.enabled:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{key}.json.gz"
+
+    def load(self, url):
+        """Return the cached record for a URL, or None if absent or unreadable."""
+        if not self.enabled:
+            return None
+        path = self._path(url)
+        if not path.exists():
+            return None
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Cache entry unreadable, ignoring: {path.name} ({e})")
+            return None
+
+    def is_fresh(self, record):
+        """True if the record can be used without asking the server.
+
+        Records carrying an ETag or Last-Modified are always revalidated; the TTL
+        only applies to responses from endpoints that send neither.
+        """
+        if not record or self.ttl_seconds <= 0:
+            return False
+        if record.get("etag") or record.get("last_modified"):
+            return False
+        return time.time() - record.get("stored_at", 0) < self.ttl_seconds
+
+    def conditional_headers(self, record):
+        """Build If-None-Match / If-Modified-Since headers from a cached record."""
+        headers = {}
+        if not record:
+            return headers
+        if record.get("etag"):
+            headers["If-None-Match"] = record["etag"]
+        if record.get("last_modified"):
+            headers["If-Modified-Since"] = record["last_modified"]
+        return headers
+
+    def store(self, url, response):
+        """Save a 200 response body with its ETag/Last-Modified validators."""
+        if not self.enabled:
+            return
+        record = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "stored_at": time.time(),
+            "size": len(response.content),
+            "body": response.text,
+        }
+        self._write(url, record)
+        self.stats["stored"] += 1
+
+    def touch(self, url, record):
+        """Restart the TTL of a record the server has just confirmed unchanged."""
+        if not self.enabled:
+            return
+        record["stored_at"] = time.time()
+        self._write(url, record)
+
+    def _write(self, url, record):
+        path = self._path(url)
+        tmp_path = path.with_suffix(".tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False)
+        tmp_path.replace(path)
+
+    def record_hit(self, revalidated=False):
+        self.stats["revalidated" if revalidated else "hits"] += 1
+
+    def record_miss(self):
+        self.stats["misses"] += 1
+
+    def summary(self):
+        s = self.stats
+        return (f"Cache: {s['hits']} fresh hits, {s['revalidated']} revalidated (304), "
+                f"{s['misses']} misses, {s['stored']} stored")
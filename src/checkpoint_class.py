@@ -0,0 +1,98 @@
+import hashlib
+import json
+import re
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+SRC_IMPORT_RE = re.compile(r"^\s*(?:from|import)\s+src\.(\w+)", re.MULTILINE)
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's contents, or None if it does not exist."""
+    path = Path(path)
+    if not path.is_file():
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stage_dependencies(script):
+    """The script plus every src/ module it imports, directly or through other src/ modules."""
+    seen = []
+    pending = [Path(script)]
+    while pending:
+        path = pending.pop()
+        if path in seen or not path.is_file():
+            continue
+        seen.append(path)
+        source = path.read_text(encoding="utf-8")
+        pending.extend(Path("src") / f"{module}.py" for module in SRC_IMPORT_RE.findall(source))
+    return sorted(seen)
+
+
+class CheckpointManifest:
+    """Per-book record of completed pipeline stages, used to resume after a failure.
+
+    Each stage records its version (a hash of the script and the src/ modules it
+    uses, so a change to e.g. the exclusion defaults invalidates 02) and the hashes
+    of the artifacts it read and wrote. A stage is reusable on the next run only
+    if all of those still match. The artifacts themselves stay in the book's own
+    output folder until the book is retried.
+    """
+
+    def __init__(self, checkpoint_root, book_id):
+        self.book_dir = Path(checkpoint_root) / str(book_id)
+        self.manifest_path = self.book_dir / "manifest.json"
+        self.book_id = str(book_id)
+        self.stages = self._load()
+
+    def _load(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("stages", {})
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        self.book_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.manifest_path, "w", encoding="utf-8") as f:
+            json.dump({"book_id": self.book_id, "stages": self.stages}, f, indent=2)
+
+    @staticmethod
+    def stage_version(script):
+        digest = hashlib.sha256()
+        for path in stage_dependencies(script):
+            digest.update(f"{path.as_posix()}:{file_hash(path)}\n".encode("utf-8"))
+        return digest.hexdigest()
+
+    def is_current(self, script, inputs, outputs):
+        """True if the stage's recorded version, inputs and outputs all still match."""
+        record = self.stages.get(script)
+        if not record or record.get("version") != self.stage_version(script):
+            return False
+        for path in inputs:
+            if record.get("inputs", {}).get(path) != file_hash(path):
+                return False
+        for path in outputs:
+            recorded = record.get("outputs", {}).get(path)
+            if recorded is None or recorded != file_hash(path):
+                return False
+        return True
+
+    def record(self, script, inputs, outputs):
+        self.stages[script] = {
+            "version": self.stage_version(script),
+            "inputs": {path: file_hash(path) for path in inputs},
+            "outputs": {path: file_hash(path) for path in outputs},
+            "completed_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        self.save()
+
+    def clear(self):
+        """Remove the manifest once the book has completed."""
+        if self.book_dir.exists():
+            shutil.rmtree(self.book_dir)
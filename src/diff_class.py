@@ -0,0 +1,224 @@
+import gzip
+import hashlib
+import json
+import re
+from html import escape, unescape
+from pathlib import Path
+
+# Block-level tags become structure tokens; inline tags (strong, em, span...) are ignored
+PARAGRAPH_TAGS = {"p", "div", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6"}
+PARAGRAPH = "¶"  # Token for the start of a paragraph
+BREAK = "↵"      # Token for a <br>
+
+# Edit budget for the Myers search: memory grows with its square, so heavily
+# rewritten entries fall back to a whole replace instead
+MAX_EDITS = 300
+
+TOKEN_RE = re.compile(r"<\s*(/?)\s*([a-zA-Z0-9]+)[^>]*>|([^\s<]+)")
+
+
+def tokenize(html):
+    """Split entry HTML into words plus ¶ (paragraph start) and ↵ (line break) tokens."""
+    tokens = []
+    for match in TOKEN_RE.finditer(html or ""):
+        closing, tag, word = match.groups()
+        if word is not None:
+            tokens.append(unescape(word))
+        elif not closing:
+            tag = tag.lower()
+            if tag in PARAGRAPH_TAGS:
+                tokens.append(PARAGRAPH)
+            elif tag == "br":
+                tokens.append(BREAK)
+    return tokens
+
+
+def myers_diff(a, b, max_edits=MAX_EDITS):
+    """Shortest edit script between two token lists as (op, tokens) runs.
+
+    Common prefix and suffix are stripped first, then Myers' O((N+M)D)
+    algorithm runs on the middle, which is close to linear when the two
+    versions mostly agree. If the middle needs more than `max_edits` edits,
+    or more than a quarter of its tokens changed, it is reported as a single
+    delete + insert.
+    """
+    prefix = 0
+    while prefix < len(a) and prefix < len(b) and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while (suffix < len(a) - prefix and suffix < len(b) - prefix
+           and a[-1 - suffix] == b[-1 - suffix]):
+        suffix += 1
+    mid_a = a[prefix:len(a) - suffix]
+    mid_b = b[prefix:len(b) - suffix]
+
+    ops = []
+    if prefix:
+        ops.append(("equal", a[:prefix]))
+    budget = min(max_edits, max(16, (len(mid_a) + len(mid_b)) // 4))
+    ops.extend(_myers_middle(mid_a, mid_b, budget))
+    if suffix:
+        ops.append(("equal", a[len(a) - suffix:]))
+    return _merge_runs(ops)
+
+
+def _myers_middle(a, b, max_edits):
+    n, m = len(a), len(b)
+    if not n and not m:
+        return []
+    if not n:
+        return [("insert", b)]
+    if not m:
+        return [("delete", a)]
+
+    offset = n + m + 1  # Keeps diagonal -d-1 at a non-negative index
+    v = [0] * (2 * offset + 2)
+    trace = []
+    for d in range(min(n + m, max_edits) + 1):
+        # Only diagonals -d-1..d+1 are read when backtracking step d
+        trace.append(v[offset - d - 1:offset + d + 2])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]          # Step down: insertion
+            else:
+                x = v[offset + k - 1] + 1      # Step right: deletion
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                return _backtrack(a, b, trace, offset, d)
+    return [("delete", a), ("insert", b)]
+
+
+def _backtrack(a, b, trace, offset, d):
+    ops = []
+    x, y = len(a), len(b)
+    for depth in range(d, 0, -1):
+        v = trace[depth]
+        base = depth + 1  # v[base + k] holds diagonal k
+        k = x - y
+        if k == -depth or (k != depth and v[base + k - 1] < v[base + k + 1]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = v[base + prev_k]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            ops.append(("equal", [a[x - 1]]))
+            x -= 1
+            y -= 1
+        if x == prev_x:
+            ops.append(("insert", [b[y - 1]]))
+        else:
+            ops.append(("delete", [a[x - 1]]))
+        x, y = prev_x, prev_y
+    while x > 0 and y > 0:
+        ops.append(("equal", [a[x - 1]]))
+        x -= 1
+        y -= 1
+    ops.reverse()
+    return ops
+
+
+def _merge_runs(ops):
+    merged = []
+    for op, tokens in ops:
+        if merged and merged[-1][0] == op:
+            merged[-1] = (op, merged[-1][1] + list(tokens))
+        else:
+            merged.append((op, list(tokens)))
+    return merged
+
+
+def summarise(ops):
+    """Counts of inserted/removed breaks, paragraphs and words."""
+    counts = {"breaks_added": 0, "paragraphs_added": 0, "breaks_removed": 0,
+              "paragraphs_removed": 0, "words_added": 0, "words_removed": 0}
+    for op, tokens in ops:
+        if op == "equal":
+            continue
+        suffix = "added" if op == "insert" else "removed"
+        for token in tokens:
+            if token == BREAK:
+                counts[f"breaks_{suffix}"] += 1
+            elif token == PARAGRAPH:
+                counts[f"paragraphs_{suffix}"] += 1
+            else:
+                counts[f"words_{suffix}"] += 1
+    counts["total"] = sum(counts.values())
+    return counts
+
+
+def render(ops):
+    """HTML of the writeback text with insertions and removals highlighted."""
+    parts = []
+    for op, tokens in ops:
+        for token in tokens:
+            if token in (PARAGRAPH, BREAK):
+                if op == "equal":
+                    parts.append("<br>")
+                elif op == "insert":
+                    parts.append(f'<ins class="mark">{token}</ins><br>')
+                else:
+                    parts.append(f'<del class="mark">{token}</del>')
+                continue
+            word = escape(token)
+            if op == "insert":
+                parts.append(f"<ins>{word}</ins> ")
+            elif op == "delete":
+                parts.append(f"<del>{word}</del> ")
+            else:
+                parts.append(f"{word} ")
+    html = "".join(parts)
+    return html[4:] if html.startswith("<br>") else html
+
+
+class EntryDiffer:
+    """Diffs original vs writeback entry HTML, caching results per book on disk.
+
+    The cache is keyed on a hash of the two inputs, so rerunning the report for
+    a book (e.g. after resuming a failed run) only diffs entries that changed.
+    Only entries used in the latest run are kept when the cache is saved.
+    """
+
+    def __init__(self, cache_file=None):
+        self.cache_file = Path(cache_file) if cache_file else None
+        self.cache = self._load()
+        self.used = {}
+        self.stats = {"cached": 0, "computed": 0}
+
+    def _load(self):
+        if not self.cache_file or not self.cache_file.exists():
+            return {}
+        try:
+            with gzip.open(self.cache_file, "rt", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        if not self.cache_file:
+            return
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with gzip.open(self.cache_file, "wt", encoding="utf-8") as f:
+            json.dump(self.used, f, ensure_ascii=False)
+
+    def diff(self, original, writeback):
+        """Return {"counts": {...}, "html": str} for one entry."""
+        original, writeback = original or "", writeback or ""
+        key = hashlib.sha1(f"{original}\0{writeback}".encode("utf-8")).hexdigest()
+        result = self.cache.get(key)
+        if result is None:
+            if original == writeback:
+                ops = [("equal", tokenize(writeback))]
+            else:
+                ops = myers_diff(tokenize(original), tokenize(writeback))
+            result = {"counts": summarise(ops), "html": render(ops)}
+            self.cache[key] = result
+            self.stats["computed"] += 1
+        else:
+            self.stats["cached"] += 1
+        self.used[key] = result
+        return result
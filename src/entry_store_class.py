@@ -0,0 +1,298 @@
+import json
+import mmap
+import os
+import shutil
+import sys
+from array import array
+from pathlib import Path
+
+# Long HTML fields kept out of the Python heap in a single byte blob
+HTML_FIELDS = ("entryOriginal", "entryFinal")
+# Short string values (document types, descriptions, flags) are interned
+INTERN_MAX_LEN = 256
+# Stores live outside outputs/ so 05_cleanup doesn't archive a second copy of the HTML
+STORE_ROOT = Path("cache/stores")
+
+_NONE = -1      # Length marker: field present with value None
+_MISSING = -2   # Length marker: field absent from the entry
+_ABSENT = object()  # Returned internally for a field absent from an entry
+
+
+class EntryRecord:
+    """Read-only, dict-like view of one row of an EntryStore."""
+
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store, row):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, field):
+        value = self._store.value(self._row, field, _ABSENT)
+        if value is _ABSENT:
+            raise KeyError(field)
+        return value
+
+    def get(self, field, default=None):
+        value = self._store.value(self._row, field, _ABSENT)
+        return default if value is _ABSENT else value
+
+    def __contains__(self, field):
+        return self._store.value(self._row, field, _ABSENT) is not _ABSENT
+
+    def to_dict(self):
+        return self._store.row_dict(self._row)
+
+
+class EntryStore:
+    """Compact, column-oriented store of chronology entries.
+
+    Scalar fields are held as one list per column with interned keys and short
+    string values. The HTML fields are concatenated into one UTF-8 blob with
+    per-row offsets; a saved store memory-maps that blob so HTML is only decoded
+    when a row is read. Entries can be looked up by id without building dicts.
+    """
+
+    def __init__(self, fields, columns, missing, offsets, html, rows):
+        self.fields = fields            # All field names, in first-seen order
+        self.columns = columns          # Scalar field -> list of values
+        self.missing = missing          # Scalar field -> set of rows where it is absent
+        self.offsets = offsets          # HTML field -> (starts array, lengths array)
+        self.html = html                # bytes/bytearray/mmap
+        self.rows = rows                # Entry count, also for stores with only HTML fields
+        self._index = None
+        self._mmap_file = None
+
+    # --- Building ---
+    @classmethod
+    def build(cls, entries, blob=None):
+        """Build a store from a list of entry dicts.
+
+        If `blob` (a binary file) is given, HTML is written straight to it
+        rather than collected in memory; see write().
+        """
+        fields = []
+        seen = set()
+        for entry in entries:
+            for key in entry:
+                if key not in seen:
+                    seen.add(key)
+                    fields.append(sys.intern(key))
+
+        scalar_fields = [f for f in fields if f not in HTML_FIELDS]
+        html_fields = [f for f in fields if f in HTML_FIELDS]
+        columns = {f: [] for f in scalar_fields}
+        missing = {f: set() for f in scalar_fields}
+        offsets = {f: (array("q"), array("q")) for f in html_fields}
+        html = bytearray()
+        position = 0
+
+        for row, entry in enumerate(entries):
+            for field in scalar_fields:
+                if field not in entry:
+                    missing[field].add(row)
+                    columns[field].append(None)
+                    continue
+                value = entry[field]
+                if isinstance(value, str) and len(value) <= INTERN_MAX_LEN:
+                    value = sys.intern(value)
+                columns[field].append(value)
+            for field in html_fields:
+                starts, lengths = offsets[field]
+                value = entry.get(field, _ABSENT)
+                if value is _ABSENT or value is None:
+                    starts.append(0)
+                    lengths.append(_MISSING if value is _ABSENT else _NONE)
+                    continue
+                encoded = value.encode("utf-8")
+                starts.append(position)
+                lengths.append(len(encoded))
+                position += len(encoded)
+                if blob is None:
+                    html.extend(encoded)
+                else:
+                    blob.write(encoded)
+
+        return cls(fields, columns, missing, offsets, html, len(entries))
+
+    @classmethod
+    def write(cls, entries, directory, source=None):
+        """Save entries as a store on disk without a second in-memory copy of their HTML."""
+        directory = cls._prepare_dir(directory)
+        with open(directory / "html.bin", "wb") as blob:
+            store = cls.build(entries, blob=blob)
+        store._save_index(directory, source)
+
+    # --- Persistence ---
+    def save(self, directory, source=None):
+        """Write the store to a directory; `source` records the JSON it was built from."""
+        directory = self._prepare_dir(directory)
+        self._save_index(directory, source)
+        with open(directory / "html.bin", "wb") as f:
+            f.write(self.html)
+
+    @staticmethod
+    def _prepare_dir(directory):
+        directory = Path(directory)
+        if directory.exists():
+            shutil.rmtree(directory)
+        directory.mkdir(parents=True)
+        return directory
+
+    def _save_index(self, directory, source):
+        meta = {
+            "rows": self.rows,
+            "fields": self.fields,
+            "columns": self.columns,
+            "missing": {f: sorted(rows) for f, rows in self.missing.items() if rows},
+            "html_fields": list(self.offsets),
+            "source": self._source_signature(source) if source else None,
+        }
+        with open(directory / "columns.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        for field, (starts, lengths) in self.offsets.items():
+            with open(directory / f"{field}.idx", "wb") as f:
+                starts.tofile(f)
+                lengths.tofile(f)
+
+    @classmethod
+    def open(cls, directory):
+        """Open a saved store, memory-mapping its HTML blob."""
+        directory = Path(directory)
+        with open(directory / "columns.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        fields = [sys.intern(f) for f in meta["fields"]]
+        columns = {}
+        for field, values in meta["columns"].items():
+            columns[sys.intern(field)] = [
+                sys.intern(v) if isinstance(v, str) and len(v) <= INTERN_MAX_LEN else v
+                for v in values
+            ]
+        missing = {f: set() for f in columns}
+        for field, rows in meta.get("missing", {}).items():
+            missing[field] = set(rows)
+
+        row_count = meta["rows"]
+        offsets = {}
+        for field in meta["html_fields"]:
+            starts, lengths = array("q"), array("q")
+            with open(directory / f"{field}.idx", "rb") as f:
+                starts.fromfile(f, row_count)
+                lengths.fromfile(f, row_count)
+            offsets[sys.intern(field)] = (starts, lengths)
+
+        store = cls(fields, columns, missing, offsets, b"", row_count)
+        blob_path = directory / "html.bin"
+        if blob_path.stat().st_size:
+            store._mmap_file = open(blob_path, "rb")
+            store.html = mmap.mmap(store._mmap_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return store
+
+    @classmethod
+    def load_or_build(cls, json_path, book_id, store_dir=None):
+        """Open the book's store for a JSON file, rebuilding it if missing or stale."""
+        json_path = Path(json_path)
+        store_dir = Path(store_dir) if store_dir else cls.default_dir(json_path, book_id)
+        meta_path = store_dir / "columns.json"
+        if meta_path.exists():
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            # Stores saved without a row count may have been read back with 0 rows
+            if "rows" in meta and meta.get("source") == cls._source_signature(json_path):
+                return cls.open(store_dir)
+
+        print(f"Building entry store for {json_path}")
+        with open(json_path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        cls.write(entries, store_dir, source=json_path)
+        del entries
+        return cls.open(store_dir)
+
+    @staticmethod
+    def default_dir(json_path, book_id):
+        """cache/stores/<BookID>/<json stem>.store"""
+        return STORE_ROOT / str(book_id) / f"{Path(json_path).stem}.store"
+
+    @staticmethod
+    def _source_signature(json_path):
+        stat = os.stat(json_path)
+        return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+    def close(self):
+        if isinstance(self.html, mmap.mmap):
+            self.html.close()
+        if self._mmap_file:
+            self._mmap_file.close()
+            self._mmap_file = None
+
+    # --- Access ---
+    def __len__(self):
+        return self.rows
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield EntryRecord(self, row)
+
+    def value(self, row, field, default=None):
+        if field in self.offsets:
+            starts, lengths = self.offsets[field]
+            length = lengths[row]
+            if length == _MISSING:
+                return default
+            if length == _NONE:
+                return None
+            start = starts[row]
+            return bytes(self.html[start:start + length]).decode("utf-8")
+        column = self.columns.get(field)
+        if column is None or row in self.missing[field]:
+            return default
+        return column[row]
+
+    def row_dict(self, row):
+        entry = {}
+        for field in self.fields:
+            value = self.value(row, field, _ABSENT)
+            if value is not _ABSENT:
+                entry[field] = value
+        return entry
+
+    def ids(self):
+        return self.columns.get("id", [])
+
+    def get(self, entry_id, default=None):
+        """Look up an entry by id, building the id index on first use."""
+        if self._index is None:
+            self._index = {entry_id: row for row, entry_id in enumerate(self.ids())}
+        row = self._index.get(entry_id)
+        return default if row is None else EntryRecord(self, row)
+
+    def field_view(self, field):
+        """Mapping of id -> field value, decoded on access."""
+        return _FieldView(self, field)
+
+    def iter_dicts(self, exclude_ids=None):
+        """Yield each entry as a fresh dict, skipping ids (compared as strings) in exclude_ids."""
+        exclude_ids = {str(i) for i in exclude_ids} if exclude_ids else None
+        ids = self.ids() if "id" in self.columns else [None] * len(self)
+        for row, entry_id in enumerate(ids):
+            if exclude_ids and str(entry_id) in exclude_ids:
+                continue
+            yield self.row_dict(row)
+
+
+class _FieldView:
+    """Minimal read-only mapping used where code expects {id: value} dicts."""
+
+    __slots__ = ("_store", "_field")
+
+    def __init__(self, store, field):
+        self._store = store
+        self._field = field
+
+    def keys(self):
+        return self._store.ids()
+
+    def get(self, entry_id, default=None):
+        record = self._store.get(entry_id)
+        return default if record is None else record.get(self._field, default)
@@ -0,0 +1,100 @@
+import json
+import re
+from pathlib import Path
+
+import pandas as pd
+
+# Used when no rules file exists; matches the original hard-coded filters
+DEFAULT_RULES = {
+    "document_types": [
+        "Allied Health Recovery Request",
+        "Clinical Records",
+        "Certificate of Capacity",
+        "Hospital Discharge Referral",
+    ],
+    "handwritten": ["True"],
+    "entry_ids": [],
+    "description_patterns": [],
+}
+
+# Entry fields the rules look at; the HTML fields are never loaded into the frame
+RULE_COLUMNS = ["id", "documentType", "handwritten", "description"]
+
+
+class ExclusionRules:
+    """Configurable rules deciding which entries 02_change_data leaves untouched.
+
+    Rules are evaluated over a whole book at once on a pandas frame. Each
+    excluded entry is attributed to the first rule it matches, in the order
+    document_type, handwritten, entry_id, description.
+    """
+
+    def __init__(self, document_types=(), handwritten=(), entry_ids=(), description_patterns=()):
+        self.document_types = list(document_types)
+        self.handwritten = list(handwritten)
+        self.entry_ids = [str(i) for i in entry_ids]
+        self.description_patterns = list(description_patterns)
+        for pattern in self.description_patterns:
+            re.compile(pattern)  # Fail early on a bad regex in the rules file
+
+    @classmethod
+    def from_file(cls, path):
+        """Load rules from JSON, using DEFAULT_RULES for the file or any missing key."""
+        rules = dict(DEFAULT_RULES)
+        path = Path(path)
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                rules.update(json.load(f))
+            print(f"Loaded exclusion rules from {path}")
+        return cls(
+            document_types=rules["document_types"],
+            handwritten=rules["handwritten"],
+            entry_ids=rules["entry_ids"],
+            description_patterns=rules["description_patterns"],
+        )
+
+    @staticmethod
+    def frame(entries):
+        """Frame of just the columns the rules need, one row per entry.
+
+        Columns stay object dtype so a missing id doesn't turn the ids into
+        floats ("123.0") and break the entry_id rule.
+        """
+        return pd.DataFrame({col: [entry.get(col) for entry in entries] for col in RULE_COLUMNS}, dtype=object)
+
+    def _masks(self, df):
+        yield "document_type", df["documentType"].isin(self.document_types)
+        yield "handwritten", df["handwritten"].isin(self.handwritten)
+        yield "entry_id", df["id"].astype(str).isin(self.entry_ids)
+        if self.description_patterns:
+            # Patterns are matched separately so inline flags like (?i) stay valid
+            descriptions = df["description"].fillna("").astype(str)
+            mask = pd.Series(False, index=df.index)
+            for pattern in self.description_patterns:
+                mask |= descriptions.str.contains(pattern, regex=True)
+            yield "description", mask
+
+    def evaluate(self, df):
+        """Series giving the rule that excludes each row, or None if it is kept."""
+        reasons = pd.Series(None, index=df.index, dtype=object)
+        for name, mask in self._masks(df):
+            reasons = reasons.where(reasons.notna() | ~mask, name)
+        return reasons
+
+    @staticmethod
+    def summarise(df, reasons):
+        """Counts of excluded entries by rule and by documentType."""
+        outcome = reasons.fillna("formatted")
+        by_type = (
+            pd.crosstab(df["documentType"].fillna("(none)"), outcome)
+            if len(df) else pd.DataFrame()
+        )
+        return {
+            "total": int(len(df)),
+            "excluded": int(reasons.notna().sum()),
+            "by_rule": {rule: int(n) for rule, n in reasons.value_counts().items()},
+            "by_document_type": {
+                doc_type: {rule: int(n) for rule, n in row.items() if n}
+                for doc_type, row in by_type.iterrows()
+            },
+        }
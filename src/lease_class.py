@@ -0,0 +1,199 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def worker_id():
+    """Identifier for this worker process, unique across hosts."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaseStore:
+    """Shared SQLite store that lets several workers process one queue safely.
+
+    - `leases`: which worker holds each book (or named lock) and until when.
+      A lease that is not renewed by heartbeats expires and can be claimed again.
+    - `results`: finished book statuses waiting to be merged into the Excel queue,
+      so an update is never lost if the workbook is open or another worker is writing.
+    - `meta`: shared key/value state, e.g. the last queue mtime seen.
+
+    Point `path` at a shared location for multiple hosts, or a local file to run
+    a single worker (or tests) against a stand-in broker.
+
+    Results are ordered by a sequence number assigned inside the store rather
+    than by wall-clock time, so comparing them does not depend on the hosts'
+    clocks agreeing. Lease expiry does use each host's clock, so clocks only
+    need to agree to well within the lease TTL.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS leases (
+                    name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS results (
+                    book_id TEXT PRIMARY KEY, status TEXT NOT NULL, processed TEXT NOT NULL,
+                    owner TEXT NOT NULL, finished_at REAL NOT NULL, merged INTEGER NOT NULL DEFAULT 0,
+                    seq INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(results)")}
+            if "seq" not in columns:
+                conn.execute("ALTER TABLE results ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+
+    @contextmanager
+    def _connect(self):
+        # A fresh connection per operation keeps the store usable from the heartbeat thread
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")  # Take the write lock before reading
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    # --- Leases ---
+    def claim(self, name, owner, ttl_seconds, since=None):
+        """Atomically take the lease on `name`; False if another live worker holds it.
+
+        If `since` (a value from result_seq()) is given, also refuse when a result
+        for `name` was recorded after it, or is still waiting to be merged: the
+        caller's view of the queue is older than that result.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT owner, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+            if row and row[0] != owner and row[1] > now:
+                return False
+            if since is not None:
+                result = conn.execute(
+                    "SELECT seq, merged FROM results WHERE book_id = ?", (name,)
+                ).fetchone()
+                if result and (result[0] > since or not result[1]):
+                    return False
+            conn.execute(
+                "INSERT OR REPLACE INTO leases (name, owner, expires_at) VALUES (?, ?, ?)",
+                (name, owner, now + ttl_seconds),
+            )
+            return True
+
+    def renew(self, name, owner, ttl_seconds):
+        """Extend a lease we hold; False if it has been lost to another worker."""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE leases SET expires_at = ? WHERE name = ? AND owner = ?",
+                (time.time() + ttl_seconds, name, owner),
+            )
+            return cursor.rowcount == 1
+
+    def release(self, name, owner):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def acquire(self, name, owner, ttl_seconds, wait_seconds=60, poll_seconds=1.0):
+        """Block until the lease on `name` is claimed or `wait_seconds` pass."""
+        deadline = time.time() + wait_seconds
+        while True:
+            if self.claim(name, owner, ttl_seconds):
+                return True
+            if time.time() >= deadline:
+                return False
+            time.sleep(poll_seconds)
+
+    @contextmanager
+    def hold(self, name, owner, ttl_seconds, wait_seconds=60):
+        """Hold the lease on `name` for the duration of a with block.
+
+        Yields whether it was acquired, so the caller can decide what to do
+        when another worker keeps it for longer than `wait_seconds`.
+        """
+        acquired = self.acquire(name, owner, ttl_seconds, wait_seconds)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self.release(name, owner)
+
+    # --- Results ---
+    def result_seq(self):
+        """Sequence number of the latest recorded result; pass to claim() as `since`."""
+        with self._connect() as conn:
+            return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM results").fetchone()[0]
+
+    def record_result(self, book_id, status, processed, owner):
+        with self._transaction() as conn:
+            seq = conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM results").fetchone()[0]
+            conn.execute(
+                "INSERT OR REPLACE INTO results (book_id, status, processed, owner, finished_at, merged, seq) "
+                "VALUES (?, ?, ?, ?, ?, 0, ?)",
+                (book_id, status, processed, owner, time.time(), seq),
+            )
+
+    def unmerged_results(self):
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT book_id, status, processed FROM results WHERE merged = 0 ORDER BY finished_at"
+            ).fetchall()
+
+    def mark_merged(self, book_ids):
+        with self._transaction() as conn:
+            conn.executemany("UPDATE results SET merged = 1 WHERE book_id = ?", [(b,) for b in book_ids])
+
+    # --- Shared state ---
+    def get_meta(self, key, default=None):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        with self._transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+
+class LeaseHeartbeat:
+    """Context manager that renews a lease in a background thread while work runs."""
+
+    def __init__(self, store, name, owner, ttl_seconds):
+        self.store = store
+        self.name = name
+        self.owner = owner
+        self.ttl_seconds = ttl_seconds
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.ttl_seconds / 3):
+            try:
+                if not self.store.renew(self.name, self.owner, self.ttl_seconds):
+                    self.lost = True
+                    print(f"[{self.name}] Lease lost to another worker.")
+                    return
+            except sqlite3.Error as e:
+                print(f"[{self.name}] Heartbeat failed: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        return False
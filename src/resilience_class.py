@@ -0,0 +1,135 @@
+import json
+import os
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+import requests
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of sending a request while the circuit breaker is open."""
+
+
+class RetryPolicy:
+    """Timeouts, retry count and backoff used by APIClient for every request."""
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, max_attempts=4, connect_timeout=5.0, read_timeout=10.0,
+                 read_timeout_per_mb=5.0, max_read_timeout=300.0,
+                 backoff_base=1.0, backoff_max=30.0, max_retry_after=120.0):
+        self.max_attempts = max_attempts
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.read_timeout_per_mb = read_timeout_per_mb
+        self.max_read_timeout = max_read_timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+
+    @classmethod
+    def from_env(cls):
+        """Build a policy from API_* environment variables, falling back to the defaults."""
+        return cls(
+            max_attempts=int(os.getenv("API_MAX_ATTEMPTS", "4")),
+            connect_timeout=float(os.getenv("API_CONNECT_TIMEOUT", "5")),
+            read_timeout=float(os.getenv("API_READ_TIMEOUT", "10")),
+            read_timeout_per_mb=float(os.getenv("API_READ_TIMEOUT_PER_MB", "5")),
+            max_read_timeout=float(os.getenv("API_MAX_READ_TIMEOUT", "300")),
+            backoff_base=float(os.getenv("API_BACKOFF_BASE", "1")),
+            backoff_max=float(os.getenv("API_BACKOFF_MAX", "30")),
+        )
+
+    def timeout_for(self, size_bytes=0):
+        """(connect, read) timeout, with the read timeout growing with the payload size."""
+        size_mb = (size_bytes or 0) / (1024 * 1024)
+        read = min(self.read_timeout + size_mb * self.read_timeout_per_mb, self.max_read_timeout)
+        return self.connect_timeout, read
+
+    def delay_for(self, attempt, retry_after=None):
+        """Seconds to wait before the next attempt (attempt counts from 0)."""
+        backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after is not None:
+            return max(backoff, min(retry_after, self.max_retry_after))
+        return backoff
+
+    @staticmethod
+    def parse_retry_after(value):
+        """Parse a Retry-After header given either as seconds or as an HTTP date."""
+        if not value:
+            return None
+        value = value.strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class CircuitBreaker:
+    """Failure counter shared by every script in a run via a small JSON state file.
+
+    Each pipeline stage runs in its own process, so the state is kept on disk:
+    once `failure_threshold` requests in a row have failed, the circuit opens and
+    requests fail fast until `reset_seconds` have passed, after which one trial
+    request is let through (half-open).
+    """
+
+    def __init__(self, state_file, failure_threshold=5, reset_seconds=300):
+        self.state_file = Path(state_file)
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            os.getenv("BREAKER_STATE_FILE", "cache/circuit_breaker.json"),
+            failure_threshold=int(os.getenv("BREAKER_THRESHOLD", "5")),
+            reset_seconds=float(os.getenv("BREAKER_RESET_SECONDS", "300")),
+        )
+
+    def _load(self):
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"failures": 0, "opened_at": None}
+
+    def _save(self, state):
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_file.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        tmp_path.replace(self.state_file)
+
+    def is_open(self):
+        """True while the circuit is open and the reset period has not yet elapsed."""
+        opened_at = self._load().get("opened_at")
+        return opened_at is not None and time.time() - opened_at < self.reset_seconds
+
+    def allow_request(self):
+        return not self.is_open()
+
+    def record_success(self):
+        state = self._load()
+        if state.get("failures") or state.get("opened_at"):
+            if state.get("opened_at"):
+                print("Circuit breaker closed: server responding again.")
+            self._save({"failures": 0, "opened_at": None})
+
+    def record_failure(self):
+        state = self._load()
+        state["failures"] = state.get("failures", 0) + 1
+        # A failed half-open trial reopens immediately
+        if state["failures"] >= self.failure_threshold or state.get("opened_at"):
+            state["opened_at"] = time.time()
+            print(f"Circuit breaker open after {state['failures']} consecutive failures; "
+                  f"pausing requests for {self.reset_seconds:.0f}s.")
+        self._save(state)
@@ -0,0 +1,121 @@
+import json
+import os
+import tempfile
+import time
+from contextlib import nullcontext
+from pathlib import Path
+
+
+class JobScheduler:
+    """Orders queued books by priority, then shortest-job-first with aging.
+
+    Cost is the entry count recorded the last time a book was fetched (or from
+    an optional pre-fetch), falling back to the median of known sizes. A book's
+    effective cost is divided by (1 + hours waiting / aging_hours), so large
+    books move up the queue the longer they wait and are never starved.
+    An aging_hours of 0 (or less) turns aging off: plain shortest-job-first.
+
+    The state file may be shared by several workers. Changes are kept as a
+    list of operations and replayed onto a fresh read of the file when saving,
+    under `lock` if given (a callable returning a context manager that yields
+    whether the lock was taken), and the file is replaced atomically.
+    """
+
+    def __init__(self, state_file, aging_hours=2.0, default_cost=1000, estimate_fn=None, lock=None):
+        self.state_file = Path(state_file)
+        self.aging_hours = aging_hours
+        self.default_cost = default_cost
+        self.estimate_fn = estimate_fn  # Optional book_id -> entry count (e.g. a cached pre-fetch)
+        self.lock = lock
+        self.state = self._load()
+        self._pending = []  # (book_id, op, key, value) not yet saved
+
+    def _load(self):
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        """Merge our pending changes into the current file and replace it atomically."""
+        if not self._pending:
+            return
+        with self.lock() if self.lock else nullcontext(True) as locked:
+            if not locked:
+                print("Could not lock the queue state; changes kept for the next save.")
+                return
+            state = self._load()  # Pick up other workers' changes
+            for book_id, op, key, value in self._pending:
+                self._apply(state.setdefault(book_id, {}), op, key, value)
+            self.state_file.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.state_file.parent, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(state, f, indent=2)
+            Path(tmp_path).replace(self.state_file)
+        self.state = state
+        self._pending = []
+
+    @staticmethod
+    def _apply(book, op, key, value):
+        if op == "set":
+            book[key] = value
+        elif op == "setdefault":
+            book.setdefault(key, value)
+        else:
+            book.pop(key, None)
+
+    def _change(self, book_id, op, key, value=None):
+        self._apply(self._book(book_id), op, key, value)
+        self._pending.append((str(book_id), op, key, value))
+
+    def _book(self, book_id):
+        return self.state.setdefault(str(book_id), {})
+
+    def record_size(self, book_id, entry_count):
+        self._change(book_id, "set", "entries", int(entry_count))
+        self.save()
+
+    def mark_done(self, book_id):
+        """Reset the waiting time so a resubmitted book ages from its new submission."""
+        self._change(book_id, "pop", "first_seen")
+        self.save()
+
+    def estimated_cost(self, book_id):
+        book = self._book(book_id)
+        if "entries" not in book and self.estimate_fn:
+            try:
+                self._change(book_id, "set", "entries", int(self.estimate_fn(book_id)))
+            except Exception as e:
+                print(f"[{book_id}] Could not estimate size: {e}")
+        if "entries" in book:
+            return book["entries"]
+        known = sorted(b["entries"] for b in self.state.values() if "entries" in b)
+        return known[len(known) // 2] if known else self.default_cost
+
+    def order(self, jobs):
+        """Sort (book_id, priority, payload) tuples into processing order.
+
+        Higher priority always runs first; within a priority, the lowest
+        aged cost runs first.
+        """
+        # Sizes recorded by other workers since we loaded count too
+        self.state = self._load()
+        for book_id, op, key, value in self._pending:
+            self._apply(self._book(book_id), op, key, value)
+
+        now = time.time()
+        for book_id, _, _ in jobs:
+            self._change(book_id, "setdefault", "first_seen", now)
+
+        def key(job):
+            book_id, priority, _ = job
+            cost = self.estimated_cost(book_id)
+            if self.aging_hours <= 0:
+                return -priority, cost
+            waited_hours = (now - self._book(book_id)["first_seen"]) / 3600
+            return -priority, cost / (1 + waited_hours / self.aging_hours)
+
+        ordered = sorted(jobs, key=key)
+        self.save()
+        return ordered
@@ -1,16 +1,27 @@
+import json
+import time
+import zlib
 import requests
 from dotenv import load_dotenv
 import os
 from bs4 import BeautifulSoup
 from html import unescape
+from src.resilience_class import RetryPolicy, CircuitBreaker, CircuitOpenError
+
+UPLOAD_CHUNK_SIZE = 256 * 1024  # Bytes of JSON buffered per chunk of a streamed upload
+
 
 class APIClient:
     """Reusable API client for handling authentication and API requests."""
     
-    def __init__(self, base_url, login_page, login_url):
+    def __init__(self, base_url, login_page, login_url, cache=None, policy=None, breaker=None):
         self.base_url = base_url
         self.login_page = login_page
         self.login_url = login_url
+        self.cache = cache  # Optional ResponseCache used by fetch_api_data
+        self.policy = policy or RetryPolicy.from_env()
+        self.breaker = breaker or CircuitBreaker.from_env()
+        self.gzip_supported = True  # Cleared if the server rejects a gzip-encoded upload
         self.session = requests.Session()
         self.user, self.password = self.load_credentials()
 
@@ -24,8 +35,12 @@ class APIClient:
         return user, password
 
     def authenticate(self):
-        """Authenticate and maintain session."""
-        self.session.get(self.login_page, headers={"User-Agent": "Mozilla/5.0"})
+        """Authenticate and maintain session.
+
+        Both login calls go through _request, so an unreachable server trips the
+        circuit breaker here and an open breaker fails fast with CircuitOpenError.
+        """
+        self._request("GET", self.login_page, headers={"User-Agent": "Mozilla/5.0"})
         payload = {"j_username": self.user, "j_password": self.password}
         login_headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
@@ -33,20 +48,81 @@ class APIClient:
             "Origin": self.base_url,
             "Content-Type": "application/x-www-form-urlencoded"
         }
-        response = self.session.post(self.login_url, data=payload, headers=login_headers, allow_redirects=True, timeout=10)
+        response = self._request("POST", self.login_url, data=payload, headers=login_headers, allow_redirects=True)
         return response.status_code == 200
 
+    def _request(self, method, url, size_hint=0, body_factory=None, **kwargs):
+        """Send a request under the retry policy and circuit breaker.
+
+        Connection errors, timeouts and retryable statuses (429/5xx) are retried
+        with jittered exponential backoff, honouring Retry-After. The last
+        retryable response is returned once attempts run out; the last exception
+        is re-raised. Raises CircuitOpenError without sending while the breaker is open.
+        A streamed body is passed as `body_factory`, called for a fresh generator per attempt.
+        """
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(f"Circuit breaker open; not sending {method} {url}")
+
+        timeout = self.policy.timeout_for(size_hint)
+        for attempt in range(self.policy.max_attempts):
+            last_attempt = attempt == self.policy.max_attempts - 1
+            if body_factory:
+                kwargs["data"] = body_factory()
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if last_attempt:
+                    self.breaker.record_failure()
+                    raise
+                delay = self.policy.delay_for(attempt)
+                print(f"{method} attempt {attempt + 1} failed ({e.__class__.__name__}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            if response.status_code not in self.policy.RETRY_STATUSES:
+                self.breaker.record_success()
+                return response
+            if last_attempt:
+                self.breaker.record_failure()
+                return response
+
+            retry_after = self.policy.parse_retry_after(response.headers.get("Retry-After"))
+            delay = self.policy.delay_for(attempt, retry_after)
+            print(f"{method} attempt {attempt + 1} got {response.status_code}; retrying in {delay:.1f}s")
+            time.sleep(delay)
+
     def fetch_api_data(self, endpoint):
-        """Fetch data from the specified API endpoint with better error handling."""
+        """Fetch data from the specified API endpoint with better error handling.
+
+        If a ResponseCache is attached, a cached copy within its TTL is returned
+        without a request, otherwise the request is made conditional on the cached
+        ETag/Last-Modified and a 304 reuses the cached body.
+        """
         url = f"{self.base_url}{endpoint}"
         headers = {"User-Agent": "Mozilla/5.0", "Accept": "application/json"}
+
+        cached = self.cache.load(url) if self.cache else None
+        if cached and self.cache.is_fresh(cached):
+            print(f"Cache hit (within TTL): {endpoint}")
+            self.cache.record_hit()
+            return json.loads(cached["body"])
+        if cached:
+            headers.update(self.cache.conditional_headers(cached))
+        size_hint = cached.get("size", 0) if cached else 0
         
         try:
-            response = self.session.get(url, headers=headers, timeout=10)
+            response = self._request("GET", url, size_hint=size_hint, headers=headers)
             
             # Print raw response for debugging
             print(f"API Response (Status {response.status_code})")  
 
+            # Server confirmed our cached copy is still current
+            if response.status_code == 304 and cached:
+                print(f"Cache hit (not modified): {endpoint}")
+                self.cache.record_hit(revalidated=True)
+                self.cache.touch(url, cached)
+                return json.loads(cached["body"])
+
             # Handle non-200 responses
             if response.status_code != 200:
                 print(f"API request failed: {response.status_code} - {response.text}")
@@ -57,7 +133,11 @@ class APIClient:
                 print("Warning: API response is empty.")
                 return None
             
-            return response.json()  # Attempt to parse JSON
+            data = response.json()  # Attempt to parse JSON
+            if self.cache:
+                self.cache.record_miss()
+                self.cache.store(url, response)
+            return data
         
         except requests.exceptions.RequestException as e:
             print(f"API request error: {e}")
@@ -66,17 +146,69 @@ class APIClient:
             print(f"JSON decode error: Response is not valid JSON. Raw response: {response.text}")
             return None
 
-    def send_put_request(self, endpoint, data):
-        """Sends a PUT request with JSON data to the specified API endpoint."""
+    @staticmethod
+    def iter_json_array(entries, compress=False, counter=None):
+        """Yield a JSON array of `entries` as byte chunks, optionally gzip-compressed.
+
+        Only one chunk of serialised JSON is held at a time. `counter` (a dict)
+        receives the raw and sent byte totals.
+        """
+        counter = counter if counter is not None else {}
+        counter["raw_bytes"] = counter["sent_bytes"] = 0
+        compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31: gzip framing
+
+        def emit(raw):
+            counter["raw_bytes"] += len(raw)
+            out = compressor.compress(raw) if compressor else raw
+            counter["sent_bytes"] += len(out)
+            return out
+
+        buffer = bytearray(b"[")
+        for i, entry in enumerate(entries):
+            if i:
+                buffer += b","
+            buffer += json.dumps(entry, ensure_ascii=False).encode("utf-8")
+            if len(buffer) >= UPLOAD_CHUNK_SIZE:
+                chunk = emit(bytes(buffer))
+                buffer.clear()
+                if chunk:
+                    yield chunk
+        buffer += b"]"
+        chunk = emit(bytes(buffer))
+        if compressor:
+            tail = compressor.flush()
+            counter["sent_bytes"] += len(tail)
+            chunk += tail
+        if chunk:
+            yield chunk
+
+    def send_put_request(self, endpoint, data, stream=False, compress=False, size_hint=None):
+        """Sends a PUT request with JSON data to the specified API endpoint.
+
+        Without streaming, `data` is a list, or any iterable of entries, which is
+        serialised straight into the body without building a list. With
+        `stream=True`, `data` may be any re-iterable of entries; the JSON
+        array is generated chunk by chunk and sent with chunked transfer
+        encoding instead of being built in memory. `compress=True` gzips the
+        stream (Content-Encoding: gzip), falling back to plain JSON if the
+        server answers 415. `size_hint` (bytes) scales the read timeout.
+        """
         url = f"{self.base_url}{endpoint}"
         headers = {
             "User-Agent": "Mozilla/5.0",
             "Content-Type": "application/json",
             "Accept": "application/json"
         }
+
+        if stream:
+            return self._send_streamed_put(url, data, headers, compress, size_hint or 0)
     
+        if isinstance(data, list):
+            body = json.dumps(data).encode("utf-8")
+        else:
+            body = b"".join(self.iter_json_array(data))
         try:
-            response = self.session.put(url, json=data, headers=headers, timeout=10)
+            response = self._request("PUT", url, size_hint=len(body), data=body, headers=headers)
             if response.status_code in [200, 201]:
                 print(f"PUT request successful: {response.status_code}")
             else:
@@ -86,6 +218,40 @@ class APIClient:
             print(f"Error sending PUT request: {e}")
             return None
 
+    def _send_streamed_put(self, url, entries, headers, compress, size_hint):
+        compress = compress and self.gzip_supported
+        if compress:
+            headers = {**headers, "Content-Encoding": "gzip"}
+        counter = {}
+        started = [0.0]
+
+        def body_factory():
+            started[0] = time.perf_counter()
+            return self.iter_json_array(entries, compress=compress, counter=counter)
+
+        try:
+            response = self._request("PUT", url, size_hint=size_hint, body_factory=body_factory, headers=headers)
+        except requests.exceptions.RequestException as e:
+            print(f"Error sending PUT request: {e}")
+            return None
+
+        if response.status_code == 415 and compress:
+            print("Server rejected gzip-encoded upload; retrying uncompressed.")
+            self.gzip_supported = False
+            headers = {k: v for k, v in headers.items() if k != "Content-Encoding"}
+            return self._send_streamed_put(url, entries, headers, False, size_hint)
+
+        elapsed = max(time.perf_counter() - started[0], 1e-6)
+        raw_mb = counter.get("raw_bytes", 0) / (1024 * 1024)
+        sent_mb = counter.get("sent_bytes", 0) / (1024 * 1024)
+        print(f"Streamed {raw_mb:.2f} MB JSON ({sent_mb:.2f} MB sent{', gzip' if compress else ''}) "
+              f"in {elapsed:.1f}s: {sent_mb / elapsed:.2f} MB/s")
+        if response.status_code in [200, 201]:
+            print(f"PUT request successful: {response.status_code}")
+        else:
+            print(f"PUT request failed: {response.status_code} - {response.text}")
+        return response
+
     @staticmethod
     def clean_html(html_content):
         """Convert HTML to clean text and ensure a non-empty result."""
@@ -0,0 +1,56 @@
+import sys
+import json
+import zipfile
+from pathlib import Path
+
+import pandas as pd
+
+from src.exclusion_class import ExclusionRules
+
+PROCESSED_DIR = Path("processed")
+RULES_FILE = Path("inputs_ctp_formatter/exclusion_rules.json")
+CHRONOLOGY_MEMBER = "json_exports/chronology.json"
+
+
+def latest_archives(processed_dir):
+    """Most recent archive per book, keyed by the BookID prefix of the zip name."""
+    latest = {}
+    for path in sorted(processed_dir.glob("*_archived_files_*.zip")):
+        latest[path.name.split("_archived_files_")[0]] = path  # Timestamps sort lexically
+    return latest
+
+
+def report(processed_dir=PROCESSED_DIR, rules_file=RULES_FILE):
+    """Re-run the exclusion rules over archived chronologies and print counts per book."""
+    rules = ExclusionRules.from_file(rules_file)
+    rows = []
+    totals = None
+
+    for book_id, archive in latest_archives(Path(processed_dir)).items():
+        with zipfile.ZipFile(archive) as zf:
+            if CHRONOLOGY_MEMBER not in zf.namelist():
+                print(f"[{book_id}] No chronology in {archive.name}, skipping")
+                continue
+            entries = json.loads(zf.read(CHRONOLOGY_MEMBER).decode("utf-8"))
+
+        frame = rules.frame(entries)
+        reasons = rules.evaluate(frame)
+        stats = rules.summarise(frame, reasons)
+        rows.append({"BookID": book_id, "Total": stats["total"], "Excluded": stats["excluded"], **stats["by_rule"]})
+
+        counts = pd.crosstab(frame["documentType"].fillna("(none)"), reasons.fillna("formatted"))
+        totals = counts if totals is None else totals.add(counts, fill_value=0)
+
+    if not rows:
+        print(f"No archives found in {processed_dir}")
+        return
+
+    print("\nExclusions per book:")
+    print(pd.DataFrame(rows).fillna(0).to_string(index=False))
+    print("\nEntries by documentType and rule (all books):")
+    print(totals.fillna(0).astype(int).to_string())
+
+
+if __name__ == "__main__":
+    # Usage: python -m utils.exclusion_report [processed_dir] [rules_file]
+    report(*sys.argv[1:3])
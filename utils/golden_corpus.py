@@ -0,0 +1,175 @@
+"""
+Golden-corpus regression and throughput harness for the 02_change_data formatter.
+
+    python -m utils.golden_corpus capture [--processed processed] [--corpus golden/corpus.jsonl.gz] [--rules FILE]
+    python -m utils.golden_corpus check [02_change_data.py:clean_html_text other.py:fast_clean ...]
+
+`capture` collects entryOriginal -> entryFinal pairs from the archives in
+processed/*.zip. `check` runs each candidate formatter over the corpus, prints
+a diff for each mismatch, and reports entries/sec plus a µs/entry histogram.
+Everything runs offline. Recapture after an intentional change to the rules.
+"""
+import argparse
+import difflib
+import gzip
+import importlib
+import importlib.util
+import json
+import sys
+import time
+import zipfile
+from pathlib import Path
+
+from src.exclusion_class import ExclusionRules
+from utils.exclusion_report import latest_archives, RULES_FILE
+
+PROCESSED_DIR = Path("processed")
+CORPUS_FILE = Path("golden/corpus.jsonl.gz")
+DEFAULT_CANDIDATE = "02_change_data.py:clean_html_text"
+WRITEBACK_MEMBER = "json_exports/chronology_writeback.json"
+
+
+def capture(processed_dir=PROCESSED_DIR, corpus_file=CORPUS_FILE, rules_file=RULES_FILE):
+    """Build the corpus from the latest archive of each book.
+
+    Entries with a non-empty entryOriginal that the exclusion rules would not
+    skip are kept; excluded entries carry the server's entryFinal rather than
+    formatter output, so they never enter the corpus.
+    """
+    rules = ExclusionRules.from_file(rules_file)
+    corpus_file = Path(corpus_file)
+    corpus_file.parent.mkdir(parents=True, exist_ok=True)
+    count = 0
+
+    with gzip.open(corpus_file, "wt", encoding="utf-8") as out:
+        for book_id, archive in latest_archives(Path(processed_dir)).items():
+            with zipfile.ZipFile(archive) as zf:
+                if WRITEBACK_MEMBER not in zf.namelist():
+                    print(f"[{book_id}] No writeback chronology in {archive.name}, skipping")
+                    continue
+                entries = json.loads(zf.read(WRITEBACK_MEMBER).decode("utf-8"))
+
+            excluded = rules.evaluate(rules.frame(entries)).notna().tolist()
+            book_count = 0
+            for entry, skip in zip(entries, excluded):
+                original = entry.get("entryOriginal") or ""
+                final = entry.get("entryFinal")
+                if skip or not original.strip() or final is None:
+                    continue
+                out.write(json.dumps({"book_id": book_id, "id": entry["id"],
+                                      "entryOriginal": original, "entryFinal": final},
+                                     ensure_ascii=False) + "\n")
+                book_count += 1
+            print(f"[{book_id}] {book_count} pairs from {archive.name}")
+            count += book_count
+
+    print(f"Corpus written to {corpus_file}: {count} pairs")
+
+
+def load_corpus(corpus_file=CORPUS_FILE):
+    with gzip.open(corpus_file, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load_candidate(spec):
+    """Resolve 'path/to/file.py:function' or 'package.module:function' to a callable."""
+    target, _, func_name = spec.rpartition(":")
+    if not target:
+        raise ValueError(f"Candidate must look like file.py:function or module:function, got {spec!r}")
+    if target.endswith(".py"):
+        module_spec = importlib.util.spec_from_file_location(Path(target).stem.replace("-", "_"), target)
+        module = importlib.util.module_from_spec(module_spec)
+        module_spec.loader.exec_module(module)
+    else:
+        module = importlib.import_module(target)
+    return getattr(module, func_name)
+
+
+def histogram(timings_us, width=40):
+    """Text histogram of per-entry timings in power-of-two µs buckets."""
+    buckets = {}
+    for t in timings_us:
+        upper = 1
+        while upper < t:
+            upper *= 2
+        buckets[upper] = buckets.get(upper, 0) + 1
+    peak = max(buckets.values())
+    lines = []
+    for upper in sorted(buckets):
+        n = buckets[upper]
+        bar = "#" * max(1, round(width * n / peak))
+        lines.append(f"  <= {upper:>8} µs | {n:>7} | {bar}")
+    return "\n".join(lines)
+
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))
+    return sorted_values[index]
+
+
+def check_candidate(spec, corpus, max_diffs=10):
+    """Run one candidate over the corpus; returns the number of mismatches."""
+    formatter = load_candidate(spec)
+    mismatches = []
+    timings_us = []
+
+    start = time.perf_counter()
+    for pair in corpus:
+        t0 = time.perf_counter_ns()
+        result = formatter(pair["entryOriginal"])
+        timings_us.append((time.perf_counter_ns() - t0) / 1000)
+        if result != pair["entryFinal"]:
+            mismatches.append((pair, result))
+    elapsed = time.perf_counter() - start
+
+    print("=" * 70)
+    print(f"Candidate: {spec}")
+    print(f"Entries: {len(corpus)}  Mismatches: {len(mismatches)}")
+    for pair, result in mismatches[:max_diffs]:
+        print(f"\n--- Book {pair['book_id']} entry {pair['id']} ---")
+        diff = difflib.unified_diff(
+            pair["entryFinal"].splitlines(), result.splitlines(),
+            fromfile="expected", tofile="candidate", lineterm="",
+        )
+        print("\n".join(diff))
+    if len(mismatches) > max_diffs:
+        print(f"\n... {len(mismatches) - max_diffs} more mismatches not shown")
+
+    if timings_us:
+        ordered = sorted(timings_us)
+        print(f"\nThroughput: {len(corpus) / elapsed:,.0f} entries/sec ({elapsed:.2f}s total)")
+        print(f"µs/entry: p50 {percentile(ordered, 50):,.0f}  p95 {percentile(ordered, 95):,.0f}  "
+              f"p99 {percentile(ordered, 99):,.0f}  max {ordered[-1]:,.0f}")
+        print(histogram(timings_us))
+    return len(mismatches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Golden-corpus harness for clean_html_text.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    cap = sub.add_parser("capture", help="Build the corpus from processed/*.zip")
+    cap.add_argument("--processed", default=PROCESSED_DIR)
+    cap.add_argument("--corpus", default=CORPUS_FILE)
+    cap.add_argument("--rules", default=RULES_FILE)
+
+    chk = sub.add_parser("check", help="Check candidate formatters against the corpus")
+    chk.add_argument("candidates", nargs="*", default=[DEFAULT_CANDIDATE])
+    chk.add_argument("--corpus", default=CORPUS_FILE)
+    chk.add_argument("--max-diffs", type=int, default=10)
+
+    args = parser.parse_args()
+    if args.command == "capture":
+        capture(args.processed, args.corpus, args.rules)
+        return
+
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        print(f"Corpus {args.corpus} is empty")
+        sys.exit(1)
+    failed = sum(check_candidate(spec, corpus, args.max_diffs) for spec in args.candidates)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()